@@ -0,0 +1,231 @@
+"""
+Müşteri bazlı indirgeme ve RFM segment etiketleme çekirdeklerini içerir.
+Numba kuruluysa tek geçişli derlenmiş çekirdekler, değilse NumPy (reduceat / maske) yolları kullanılır.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src._array_utils import integer_codes
+
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+NS_PER_DAY = 86_400_000_000_000
+
+# Çekirdek çıktı sütunları (sıra önemlidir)
+SUMMARY_COLUMNS = [
+    'T', 'recency', 'lifetime', 'transactions', 'unique_invoices',
+    'total_qty', 'avg_qty', 'std_qty', 'total_spend', 'avg_spend', 'std_spend'
+]
+_INT_COLUMNS = ['T', 'recency', 'lifetime', 'transactions', 'unique_invoices']
+
+
+if _HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def per_customer_reduce(date_ns_sorted, qty_sorted, price_sorted, inv_codes_sorted,
+                            starts, counts, last_date_ns, out):
+        """
+        (CustomerID, fatura kodu) sırasına dizilmiş diziler üzerinde her müşteri için tek
+        geçişte tarih, adet, tutar ve fatura istatistiklerini hesaplar ve `out` dizisine yazar.
+        """
+        for g in prange(len(starts)):
+            s = starts[g]
+            n = counts[g]
+            min_date = date_ns_sorted[s]
+            max_date = date_ns_sorted[s]
+            sum_qty = 0.0
+            sum_qty_sq = 0.0
+            sum_price = 0.0
+            sum_price_sq = 0.0
+            n_invoices = 1
+            for i in range(s, s + n):
+                d = date_ns_sorted[i]
+                if d < min_date:
+                    min_date = d
+                if d > max_date:
+                    max_date = d
+                q = qty_sorted[i]
+                p = price_sorted[i]
+                sum_qty += q
+                sum_qty_sq += q * q
+                sum_price += p
+                sum_price_sq += p * p
+                # Segment içinde fatura kodları sıralı: her değişim yeni bir fatura
+                if i > s and inv_codes_sorted[i] != inv_codes_sorted[i - 1]:
+                    n_invoices += 1
+
+            out[g, 0] = (last_date_ns - min_date) // NS_PER_DAY
+            out[g, 1] = (last_date_ns - max_date) // NS_PER_DAY
+            out[g, 2] = (max_date - min_date) // NS_PER_DAY
+            out[g, 3] = n
+            out[g, 4] = n_invoices
+            out[g, 5] = sum_qty
+            out[g, 6] = sum_qty / n
+            out[g, 8] = sum_price
+            out[g, 9] = sum_price / n
+            if n > 1:
+                out[g, 7] = np.sqrt(max((sum_qty_sq - sum_qty * sum_qty / n) / (n - 1), 0.0))
+                out[g, 10] = np.sqrt(max((sum_price_sq - sum_price * sum_price / n) / (n - 1), 0.0))
+            else:
+                out[g, 7] = np.nan
+                out[g, 10] = np.nan
+
+
+def _sum_mean_std(values, starts, counts):
+    """
+    Sıralı dizide her grup için toplam, ortalama ve örneklem standart sapmasını hesaplar.
+
+    Standart sapma toplam / kareler toplamı özdeşliğinden türetilir; tek işlemli gruplar için NaN döner.
+    """
+    sums = np.add.reduceat(values, starts)
+    sum_sq = np.add.reduceat(values * values, starts)
+    means = sums / counts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var = (sum_sq - sums * means) / (counts - 1)
+    std = np.sqrt(np.clip(var, 0, None))
+    std[counts < 2] = np.nan
+    return sums, means, std
+
+
+def _reduce_numpy(cid_sorted, dates, qty, price, inv_codes, starts, counts, last_date_ns, out):
+    """Numba yoksa aynı indirgemeleri NumPy reduceat ile hesaplar."""
+    date_min = np.minimum.reduceat(dates, starts)
+    date_max = np.maximum.reduceat(dates, starts)
+
+    # Farklı fatura sayısı: (müşteri, fatura) sıralı olduğundan komşu çiftlerin değişimi sayılır
+    is_new = np.ones(len(cid_sorted), dtype=bool)
+    is_new[1:] = (cid_sorted[1:] != cid_sorted[:-1]) | (inv_codes[1:] != inv_codes[:-1])
+
+    out[:, 0] = (last_date_ns - date_min) // NS_PER_DAY
+    out[:, 1] = (last_date_ns - date_max) // NS_PER_DAY
+    out[:, 2] = (date_max - date_min) // NS_PER_DAY
+    out[:, 3] = counts
+    out[:, 4] = np.add.reduceat(is_new, starts)
+    out[:, 5], out[:, 6], out[:, 7] = _sum_mean_std(qty, starts, counts)
+    out[:, 8], out[:, 9], out[:, 10] = _sum_mean_std(price, starts, counts)
+
+
+# _label_segments çıktısındaki kodların segment isimleri (sıra önemlidir)
+SEGMENT_LABELS = ['Low-Value', 'Champions', 'Loyal Customers', 'Potential Loyalists', 'At Risk', 'Lost']
+
+
+if _HAS_NUMBA:
+    @njit(cache=True)
+    def _label_segments_numba(r, f):
+        out = np.zeros(len(r), dtype=np.int8)
+        for i in range(len(r)):
+            ri = r[i]
+            fi = f[i]
+            # Koşullar özelden genele; ilk eşleşen segment kazanır
+            if ri < 2 and fi < 2:
+                out[i] = 5
+            elif ri < 2 and fi >= 4:
+                out[i] = 4
+            elif ri >= 3 and fi < 3:
+                out[i] = 3
+            elif ri >= 2 and ri < 4 and fi >= 3:
+                out[i] = 2
+            elif ri >= 4:
+                out[i] = 1
+        return out
+
+
+def _label_segments_numpy(r, f):
+    """Numba yoksa aynı kuralları sırayla uygulanan NumPy maskeleriyle hesaplar."""
+    out = np.zeros(len(r), dtype=np.int8)
+    out[r >= 4] = 1
+    out[(r >= 2) & (r < 4) & (f >= 3)] = 2
+    out[(r >= 3) & (f < 3)] = 3
+    out[(r < 2) & (f >= 4)] = 4
+    out[(r < 2) & (f < 2)] = 5
+    return out
+
+
+def label_segments(r, f):
+    """
+    R ve F skorlarından her müşterinin segment kodunu tek geçişte hesaplar.
+
+    Args:
+        r (array-like): R skorları (1-5)
+        f (array-like): F skorları (1-5)
+
+    Returns:
+        np.ndarray: SEGMENT_LABELS içindeki sıraya göre int8 segment kodları
+    """
+    r = np.ascontiguousarray(r, dtype=np.int8)
+    f = np.ascontiguousarray(f, dtype=np.int8)
+    if _HAS_NUMBA:
+        return _label_segments_numba(r, f)
+    return _label_segments_numpy(r, f)
+
+
+_warmed_up = set()
+
+
+def _invoice_code_dtype(invoice_no):
+    """InvoiceNo için çekirdeğe verilecek tamsayı kod tipini döndürür."""
+    if isinstance(invoice_no.dtype, pd.CategoricalDtype):
+        return invoice_no.cat.codes.dtype
+    return np.dtype(np.intp)
+
+
+def warmup(data):
+    """
+    Numba çekirdeğini verinin fatura kodu tipi için tek satırlık örnekle bir kez derler.
+
+    İlk gerçek çağrının derleme süresini beklememesi için sınıf kurulumunda çağrılır;
+    Numba yoksa veya çekirdek bu tip için zaten derlenmişse bir şey yapmaz.
+    """
+    code_dtype = _invoice_code_dtype(data['InvoiceNo'])
+    if not _HAS_NUMBA or code_dtype in _warmed_up:
+        return
+    one = np.ones(1, dtype=np.float64)
+    index = np.zeros(1, dtype=np.int64)
+    out = np.empty((1, len(SUMMARY_COLUMNS)), dtype=np.float64)
+    per_customer_reduce(index, one, one, np.zeros(1, dtype=code_dtype), index, index + 1, np.int64(0), out)
+    _warmed_up.add(code_dtype)
+
+
+def customer_aggregates(data, last_date):
+    """
+    İşlem verisinden müşteri bazlı özet metrikleri hesaplar.
+
+    Args:
+        data (pd.DataFrame): Temizlenmiş işlem verisi
+        last_date: Recency ve T hesabında kullanılacak son tarih
+
+    Returns:
+        pd.DataFrame: CustomerID indeksli, SUMMARY_COLUMNS sütunlu özet tablo
+    """
+    last_date_ns = np.datetime64(last_date, 'ns').view('i8')
+
+    # InvoiceNo ve CustomerID'yi bir kez tamsayı koda indir (kategorikse mevcut kodlar kullanılır);
+    # müşteri kimlikleri sonda kod eşlemesinden okunur
+    inv_codes, _ = integer_codes(data['InvoiceNo'])
+    cid, cid_labels = integer_codes(data['CustomerID'], sort=True)
+
+    # (CustomerID, fatura kodu) sırasına bir kez diz; tüm diziler bu sırayla toplanır
+    order = np.lexsort((inv_codes, cid))
+    cid_sorted = cid[order]
+    inv_codes = inv_codes[order]
+    dates = data['InvoiceDate'].to_numpy(dtype='datetime64[ns]').view('i8')[order]
+    qty = data['Quantity'].to_numpy(dtype=np.float64)[order]
+    price = data['TotalPrice'].to_numpy(dtype=np.float64)[order]
+
+    # Grup sınırları
+    customers, starts, counts = np.unique(cid_sorted, return_index=True, return_counts=True)
+    customers = cid_labels.to_numpy()[customers]
+
+    out = np.empty((len(starts), len(SUMMARY_COLUMNS)), dtype=np.float64)
+    if _HAS_NUMBA:
+        per_customer_reduce(dates, qty, price, inv_codes, starts, counts, last_date_ns, out)
+    else:
+        _reduce_numpy(cid_sorted, dates, qty, price, inv_codes, starts, counts, last_date_ns, out)
+
+    summary = pd.DataFrame(out, columns=SUMMARY_COLUMNS, index=pd.Index(customers, name='CustomerID'))
+    summary[_INT_COLUMNS] = summary[_INT_COLUMNS].astype(np.int64)
+    return summary
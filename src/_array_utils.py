@@ -0,0 +1,45 @@
+"""
+Analiz modüllerinin ortak kullandığı küçük NumPy yardımcılarını içerir.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def integer_codes(column, sort=False):
+    """
+    Sütunu tamsayı kodlara indirger; kategorikse mevcut kodlar, değilse pd.factorize kullanılır.
+
+    Args:
+        column (pd.Series): Kodlanacak sütun (ör. CustomerID, InvoiceNo)
+        sort (bool): Kategorik olmayan sütunda kodlar sıralı değerlere göre verilsin mi
+
+    Returns:
+        tuple: (kod dizisi, kod -> değer eşlemesi olan pd.Index)
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy(), column.cat.categories
+    codes, labels = pd.factorize(column, sort=sort)
+    return codes, pd.Index(labels)
+
+
+def top_n_positions(values, n=10):
+    """
+    En büyük n değerin konumlarını büyükten küçüğe sıralı döndürür.
+
+    Tüm diziyi sıralamak yerine np.argpartition ile O(N) seçim yapılır, yalnızca seçilen
+    n eleman sıralanır. NaN değerler, sort_values'ta olduğu gibi sona kalır.
+
+    Args:
+        values (array-like): Sayısal değerler
+        n (int): Seçilecek eleman sayısı
+
+    Returns:
+        np.ndarray: .iloc ile kullanılabilecek konum dizisi
+    """
+    neg = -np.asarray(values, dtype=np.float64)
+    n = min(n, len(neg))
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+    idx = np.argpartition(neg, n - 1)[:n]
+    return idx[np.argsort(neg[idx], kind='stable')]
@@ -0,0 +1,27 @@
+"""
+Analiz sınıflarının ortak kullandığı grafik yardımcılarını içerir.
+"""
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+
+def fast_hist(values, bins=50, ax=None):
+    """
+    Histogramı np.histogram ile önceden hesaplayıp çubuk grafik olarak çizer.
+    
+    Args:
+        values (array-like): Dağılımı çizilecek değerler (NaN/sonsuz değerler atlanır)
+        bins (int): Bölme sayısı
+        ax (matplotlib.axes.Axes): Çizim yapılacak eksen. None ise aktif eksen kullanılır.
+    
+    Returns:
+        matplotlib.container.BarContainer: Çizilen çubuklar
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=bins)
+    
+    if ax is None:
+        ax = plt.gca()
+    return ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge')
@@ -7,6 +7,18 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import warnings
 
+from src._agg_kernels import NS_PER_DAY
+from src._plotting import fast_hist
+from src.customer_summary import build_summary
+
+try:
+    from sklearn.model_selection import train_test_split
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, roc_curve
+    _HAS_SKLEARN = True
+except ImportError:
+    _HAS_SKLEARN = False
+
 plt.style.use('seaborn-v0_8-whitegrid')
 warnings.filterwarnings('ignore')
 
@@ -14,12 +26,24 @@ warnings.filterwarnings('ignore')
 class CustomerChurnAnalyzer:
     """Müşteri kaybı (churn) analizi işlemlerini gerçekleştirir."""
     
-    def __init__(self, data):
+    def __init__(self, data, plot=True):
         """
         Args:
             data (pd.DataFrame): Churn analizi yapılacak veri seti
+            plot (bool): Grafikler çizilsin mi; toplu/başsız çalıştırmalarda False verilir
         """
         self.data = data
+        self.plot = plot
+        self._gb = None
+        # Son tarih bir kez hesaplanır; gün farkları int64 ns görünümü üzerinden alınır
+        self._last_date = pd.Timestamp(self.data['InvoiceDate'].values.max())
+    
+    @property
+    def gb(self):
+        """CustomerID bazlı groupby nesnesi; ilk kullanımda bir kez oluşturulur."""
+        if self._gb is None:
+            self._gb = self.data.groupby('CustomerID', sort=False, observed=True)
+        return self._gb
     
     def define_churn(self, inactivity_threshold=90):
         """
@@ -31,48 +55,47 @@ class CustomerChurnAnalyzer:
         Returns:
             pd.DataFrame: Churn bilgisi eklenmiş müşteri veri seti
         """
-        # Son tarih ve müşteri bazlı son işlem tarihi
-        last_date = self.data['InvoiceDate'].max()
-        
         # Müşteri bazında son işlem tarihini hesapla
-        customer_last_purchase = self.data.groupby('CustomerID')['InvoiceDate'].max().reset_index()
-        customer_last_purchase['DaysSinceLastPurchase'] = (last_date - customer_last_purchase['InvoiceDate']).dt.days
-        
-        # Churn tanımı: Son X günden fazla süredir işlem yapmayan müşteriler
-        customer_last_purchase['IsChurned'] = customer_last_purchase['DaysSinceLastPurchase'] > inactivity_threshold
-        
-        # Churn oranını hesapla
-        churn_rate = customer_last_purchase['IsChurned'].mean()
+        customer_last_purchase = self.gb['InvoiceDate'].max().reset_index()
+        last_purchase_ns = customer_last_purchase['InvoiceDate'].to_numpy(dtype='datetime64[ns]').view('i8')
+        customer_last_purchase['DaysSinceLastPurchase'] = (self._last_date.as_unit('ns').value - last_purchase_ns) // NS_PER_DAY
+        
+        # Churn tanımı: Son X günden fazla süredir işlem yapmayan müşteriler (bitişik np.bool_ dizisi)
+        is_churned = customer_last_purchase['DaysSinceLastPurchase'].to_numpy() > inactivity_threshold
+        customer_last_purchase['IsChurned'] = is_churned
+        
+        # Churn ve aktif müşteri sayısı ile oran tek toplamdan türetilir
+        churn_count = int(is_churned.sum())
+        active_count = is_churned.size - churn_count
+        churn_rate = churn_count / is_churned.size
         print(f"Churn Oranı ({inactivity_threshold} gün inaktiflik eşiği): {churn_rate:.2%}")
         
-        # Churn ve aktif müşteri sayısı
-        churn_count = customer_last_purchase['IsChurned'].sum()
-        active_count = len(customer_last_purchase) - churn_count
-        
         # Pasta grafiği ile görselleştirme
-        plt.figure(figsize=(8, 8))
-        plt.pie([active_count, churn_count], 
-                labels=['Aktif', 'Churn'], 
-                autopct='%1.1f%%',
-                colors=['green', 'red'],
-                explode=[0, 0.1],
-                startangle=90)
-        plt.title(f'Müşteri Churn Oranı ({inactivity_threshold} Gün İnaktiflik)', fontsize=14)
-        plt.axis('equal')
-        plt.tight_layout()
-        plt.show()
+        if self.plot:
+            plt.figure(figsize=(8, 8))
+            plt.pie([active_count, churn_count], 
+                    labels=['Aktif', 'Churn'], 
+                    autopct='%1.1f%%',
+                    colors=['green', 'red'],
+                    explode=[0, 0.1],
+                    startangle=90)
+            plt.title(f'Müşteri Churn Oranı ({inactivity_threshold} Gün İnaktiflik)', fontsize=14)
+            plt.axis('equal')
+            plt.tight_layout()
+            plt.show()
         
         # Son alışverişten bu yana geçen gün dağılımı
-        plt.figure(figsize=(12, 6))
-        sns.histplot(data=customer_last_purchase, x='DaysSinceLastPurchase', bins=30)
-        plt.axvline(x=inactivity_threshold, color='r', linestyle='--', 
-                   label=f'{inactivity_threshold} Gün Eşiği')
-        plt.title('Son Alışverişten Bu Yana Geçen Gün Dağılımı', fontsize=14)
-        plt.xlabel('Son Alışverişten Bu Yana Geçen Gün')
-        plt.ylabel('Müşteri Sayısı')
-        plt.legend()
-        plt.tight_layout()
-        plt.show()
+        if self.plot:
+            plt.figure(figsize=(12, 6))
+            fast_hist(customer_last_purchase['DaysSinceLastPurchase'], bins=30)
+            plt.axvline(x=inactivity_threshold, color='r', linestyle='--', 
+                       label=f'{inactivity_threshold} Gün Eşiği')
+            plt.title('Son Alışverişten Bu Yana Geçen Gün Dağılımı', fontsize=14)
+            plt.xlabel('Son Alışverişten Bu Yana Geçen Gün')
+            plt.ylabel('Müşteri Sayısı')
+            plt.legend()
+            plt.tight_layout()
+            plt.show()
         
         return customer_last_purchase
     
@@ -86,27 +109,23 @@ class CustomerChurnAnalyzer:
         Returns:
             pd.DataFrame: Churn tahmini için özellikler içeren veri seti
         """
-        # Son tarih
-        last_date = self.data['InvoiceDate'].max()
-        
-        # Müşteri bazında özetleme
-        customer_features = self.data.groupby('CustomerID').agg({
-            'InvoiceDate': [
-                lambda x: (x.max() - x.min()).days,  # Müşteri ilişki süresi
-                lambda x: (last_date - x.max()).days,  # Son alışverişten bu yana geçen gün
-                'count'  # Toplam işlem sayısı
-            ],
-            'InvoiceNo': 'nunique',  # Farklı fatura sayısı
-            'Quantity': ['sum', 'mean', 'std'],  # Miktar istatistikleri
-            'TotalPrice': ['sum', 'mean', 'std']  # Tutar istatistikleri
-        })
+        # Müşteri bazında özetleme (paylaşılan müşteri özeti)
+        summary = build_summary(self.data, self._last_date)
         
         # Sütun isimlerini düzenle
-        customer_features.columns = [
-            'CustomerLifetime', 'DaysSinceLastPurchase', 'TotalTransactions',
-            'UniqueInvoices', 'TotalQuantity', 'AvgQuantity', 'StdQuantity',
-            'TotalSpend', 'AvgSpend', 'StdSpend'
-        ]
+        feature_names = {
+            'lifetime': 'CustomerLifetime',  # Müşteri ilişki süresi
+            'recency': 'DaysSinceLastPurchase',  # Son alışverişten bu yana geçen gün
+            'transactions': 'TotalTransactions',  # Toplam işlem sayısı
+            'unique_invoices': 'UniqueInvoices',  # Farklı fatura sayısı
+            'total_qty': 'TotalQuantity',  # Miktar istatistikleri
+            'avg_qty': 'AvgQuantity',
+            'std_qty': 'StdQuantity',
+            'total_spend': 'TotalSpend',  # Tutar istatistikleri
+            'avg_spend': 'AvgSpend',
+            'std_spend': 'StdSpend'
+        }
+        customer_features = summary[list(feature_names)].rename(columns=feature_names)
         
         # Ortalama sipariş değeri
         customer_features['AvgOrderValue'] = customer_features['TotalSpend'] / customer_features['UniqueInvoices']
@@ -133,55 +152,56 @@ class CustomerChurnAnalyzer:
         Returns:
             tuple: (model, X_test, y_test, feature_importances)
         """
-        try:
-            from sklearn.model_selection import train_test_split
-            from sklearn.ensemble import RandomForestClassifier
-            from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score, roc_curve
-            
-            # Özellikleri hazırla
-            if features is None:
-                features = self.churn_prediction_features(inactivity_threshold)
-            
-            # Aşırı dengesiz veri kontrolü
-            churn_ratio = features['IsChurned'].mean()
-            print(f"Churn Oranı: {churn_ratio:.2%}")
-            
-            # Özellikler ve hedef
-            X = features.drop(['IsChurned'], axis=1)
-            y = features['IsChurned']
-            
-            # Eğitim ve test setlerine ayır
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.3, random_state=42, stratify=y
-            )
-            
-            # Model eğitimi
-            model = RandomForestClassifier(
-                n_estimators=100, 
-                max_depth=8,
-                min_samples_split=10,
-                random_state=42,
-                class_weight='balanced'  # Dengesiz veri için ağırlık uygula
-            )
-            
-            model.fit(X_train, y_train)
-            
-            # Tahmin
-            y_pred = model.predict(X_test)
-            y_pred_proba = model.predict_proba(X_test)[:, 1]
-            
-            # Model değerlendirme
-            print("\nModel Değerlendirme:")
-            print(classification_report(y_test, y_pred))
-            
-            print("\nConfusion Matrix:")
-            cm = confusion_matrix(y_test, y_pred)
-            print(cm)
-            
-            # ROC Eğrisi
-            auc_score = roc_auc_score(y_test, y_pred_proba)
-            fpr, tpr, _ = roc_curve(y_test, y_pred_proba)
-            
+        if not _HAS_SKLEARN:
+            print("scikit-learn paketi bulunamadı. Lütfen pip install scikit-learn komutu ile yükleyin.")
+            return None, None, None, None
+        
+        # Özellikleri hazırla
+        if features is None:
+            features = self.churn_prediction_features(inactivity_threshold)
+        
+        # Aşırı dengesiz veri kontrolü
+        churn_ratio = features['IsChurned'].mean()
+        print(f"Churn Oranı: {churn_ratio:.2%}")
+        
+        # Özellikler ve hedef
+        X = features.drop(['IsChurned'], axis=1)
+        y = features['IsChurned']
+        
+        # Eğitim ve test setlerine ayır
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.3, random_state=42, stratify=y
+        )
+        
+        # Model eğitimi
+        model = RandomForestClassifier(
+            n_estimators=100, 
+            max_depth=8,
+            min_samples_split=10,
+            random_state=42,
+            class_weight='balanced',  # Dengesiz veri için ağırlık uygula
+            n_jobs=-1  # Ağaçları tüm çekirdeklerde paralel eğit
+        )
+        
+        model.fit(X_train, y_train)
+        
+        # Tahmin
+        y_pred = model.predict(X_test)
+        y_pred_proba = model.predict_proba(X_test)[:, 1]
+        
+        # Model değerlendirme
+        print("\nModel Değerlendirme:")
+        print(classification_report(y_test, y_pred))
+        
+        print("\nConfusion Matrix:")
+        cm = confusion_matrix(y_test, y_pred)
+        print(cm)
+        
+        # ROC Eğrisi
+        auc_score = roc_auc_score(y_test, y_pred_proba)
+        fpr, tpr, _ = roc_curve(y_test, y_pred_proba)
+        
+        if self.plot:
             plt.figure(figsize=(8, 6))
             plt.plot(fpr, tpr, label=f'AUC = {auc_score:.3f}')
             plt.plot([0, 1], [0, 1], 'k--')
@@ -190,21 +210,18 @@ class CustomerChurnAnalyzer:
             plt.title('ROC Curve - Churn Prediction')
             plt.legend()
             plt.show()
-            
-            # Özellik önemliliği
-            feature_importances = pd.DataFrame({
-                'Feature': X.columns,
-                'Importance': model.feature_importances_
-            }).sort_values('Importance', ascending=False)
-            
+        
+        # Özellik önemliliği
+        feature_importances = pd.DataFrame({
+            'Feature': X.columns,
+            'Importance': model.feature_importances_
+        }).sort_values('Importance', ascending=False)
+        
+        if self.plot:
             plt.figure(figsize=(10, 6))
             sns.barplot(x='Importance', y='Feature', data=feature_importances.head(10))
             plt.title('En Önemli 10 Özellik - Churn Tahmini')
             plt.tight_layout()
             plt.show()
-            
-            return model, X_test, y_test, feature_importances
-            
-        except ImportError:
-            print("scikit-learn paketi bulunamadı. Lütfen pip install scikit-learn komutu ile yükleyin.")
-            return None, None, None, None
\ No newline at end of file
+        
+        return model, X_test, y_test, feature_importances
\ No newline at end of file
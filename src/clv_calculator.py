@@ -3,11 +3,24 @@ Customer Lifetime Value (Müşteri Yaşam Boyu Değeri) hesaplama işlemlerini g
 BG/NBD (Beta-Geometric/Negative Binomial Distribution) ve Gamma-Gamma modelleri kullanılır.
 """
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import warnings
 
+from src._agg_kernels import warmup
+from src._array_utils import top_n_positions
+from src._plotting import fast_hist
+from src.customer_summary import build_summary
+
+try:
+    from lifetimes import BetaGeoFitter, GammaGammaFitter
+    from lifetimes.plotting import plot_frequency_recency_matrix, plot_probability_alive_matrix
+    _HAS_LIFETIMES = True
+except ImportError:
+    _HAS_LIFETIMES = False
+
 plt.style.use('seaborn-v0_8-whitegrid')
 plt.rcParams['figure.figsize'] = (12, 8)
 warnings.filterwarnings('ignore')
@@ -16,12 +29,18 @@ warnings.filterwarnings('ignore')
 class CLVCalculator:
     """Customer Lifetime Value (Müşteri Yaşam Boyu Değeri) hesaplama işlemlerini gerçekleştirir."""
     
-    def __init__(self, data):
+    def __init__(self, data, plot=True):
         """
         Args:
             data (pd.DataFrame): CLV hesaplaması yapılacak veri seti
+            plot (bool): Grafikler çizilsin mi; toplu/başsız çalıştırmalarda False verilir
         """
         self.data = data
+        self.plot = plot
+        # Son tarih bir kez hesaplanır
+        self._last_date = pd.Timestamp(self.data['InvoiceDate'].values.max())
+        # Müşteri özeti çekirdeğini önceden derle
+        warmup(data)
         
     def prepare_for_bgnbd(self):
         """
@@ -31,17 +50,9 @@ class CLVCalculator:
             pd.DataFrame: Müşteri başına RFM değerlerini içeren veri seti
             datetime: Veri setindeki son tarih
         """
-        # Veri setindeki son tarih
-        last_date = self.data['InvoiceDate'].max()
-        
-        # Müşteri bazında özet metrikleri hesapla
-        summary = self.data.groupby('CustomerID').agg({
-            'InvoiceDate': [
-                lambda x: (last_date - x.min()).days,  # Müşteri yaşı (T)
-                lambda x: (last_date - x.max()).days   # Son alışverişten bu yana geçen gün (recency)
-            ],
-            'InvoiceNo': lambda x: len(x.unique()),    # Fatura sayısı (frequency)
-        })
+        # Müşteri bazında özet metrikleri (paylaşılan müşteri özeti)
+        # T: müşteri yaşı, recency: son alışverişten bu yana geçen gün, frequency: fatura sayısı
+        summary = build_summary(self.data, self._last_date)[['T', 'recency', 'unique_invoices']]
         
         # Sütun isimlerini düzenle
         summary.columns = ['T', 'recency', 'frequency']
@@ -52,7 +63,7 @@ class CLVCalculator:
         # İlk alışverişi yok sayarak tekrar satın alma var mı?
         summary = summary[summary['frequency'] > 0]
         
-        return summary, last_date
+        return summary, self._last_date
     
     def fit_bgnbd_model(self):
         """
@@ -61,57 +72,62 @@ class CLVCalculator:
         Returns:
             tuple: (model, summary DataFrame, predicted_purchases DataFrame)
         """
-        try:
-            from lifetimes import BetaGeoFitter
-            from lifetimes.plotting import plot_frequency_recency_matrix
-            from lifetimes.plotting import plot_probability_alive_matrix
-            
-            # Veriyi hazırla
-            summary, last_date = self.prepare_for_bgnbd()
-            
-            # BG/NBD modelini oluştur ve fit et
-            bgf = BetaGeoFitter(penalizer_coef=0.0)
-            bgf.fit(summary['frequency'], summary['recency'], summary['T'])
-            
-            print("BG/NBD Model Parametreleri:")
-            print(bgf.summary)
-            
-            # Frekans/Recency Matrisi
+        if not _HAS_LIFETIMES:
+            print("'lifetimes' paketi bulunamadı. Lütfen pip install lifetimes komutu ile yükleyin.")
+            return None, None, None
+        
+        # Veriyi hazırla
+        summary, last_date = self.prepare_for_bgnbd()
+        
+        # BG/NBD modelini oluştur ve fit et
+        bgf = BetaGeoFitter(penalizer_coef=0.0)
+        bgf.fit(summary['frequency'], summary['recency'], summary['T'])
+        
+        print("BG/NBD Model Parametreleri:")
+        print(bgf.summary)
+        
+        # Frekans/Recency Matrisi
+        if self.plot:
             plt.figure(figsize=(12, 8))
             plot_frequency_recency_matrix(bgf, T=summary['T'].max())
             plt.title('Frekans/Recency Matrisi: Beklenen Alışveriş Sayısı')
             plt.show()
-            
-            # Müşteri Hayatta Kalma Olasılık Matrisi
+        
+        # Müşteri Hayatta Kalma Olasılık Matrisi
+        if self.plot:
             plt.figure(figsize=(12, 8))
             plot_probability_alive_matrix(bgf)
             plt.title('Müşteri Hayatta Kalma Olasılık Matrisi')
             plt.show()
-            
-            # Gelecek 30/60/90 günlük satın alma tahminleri
-            t_values = [30, 60, 90]
-            predicted_purchases = pd.DataFrame()
-            
-            for t in t_values:
-                predicted_purchases[f'predicted_purchases_{t}d'] = bgf.predict(t, 
-                                                                            summary['frequency'],
-                                                                            summary['recency'], 
-                                                                            summary['T'])
-            
-            # Tahmin edilen satın alımları görselleştir
+        
+        # Gelecek 30/60/90 günlük satın alma tahminleri
+        # Girdiler bitişik float64 dizilere çevrilir; tüm ufuklar tek çağrıda (t x müşteri) yayınlanır
+        t_values = [30, 60, 90]
+        frequency = summary['frequency'].to_numpy(dtype=np.float64)
+        recency = summary['recency'].to_numpy(dtype=np.float64)
+        T = summary['T'].to_numpy(dtype=np.float64)
+        predictions = bgf.predict(np.array(t_values, dtype=np.float64)[:, None], frequency, recency, T)
+        
+        predicted_purchases = pd.DataFrame(
+            predictions.T,
+            columns=[f'predicted_purchases_{t}d' for t in t_values],
+            index=summary.index
+        )
+        
+        # Tahmin edilen satın alımları görselleştir
+        if self.plot:
             plt.figure(figsize=(12, 6))
-            ax = predicted_purchases[f'predicted_purchases_{t_values[0]}d'].hist(bins=50)
+            fast_hist(predicted_purchases[f'predicted_purchases_{t_values[0]}d'], bins=50)
             plt.title(f'Gelecek {t_values[0]} Gün İçin Tahmin Edilen Satın Alma Dağılımı')
             plt.xlabel('Tahmin Edilen Satın Alma Sayısı')
             plt.ylabel('Müşteri Sayısı')
             plt.show()
-            
-            # En yüksek tahmin edilen satın alımlara sahip müşteriler
-            predicted_purchases_with_id = predicted_purchases.copy()
-            predicted_purchases_with_id.index = summary.index
-            
-            top_predicted = predicted_purchases_with_id[f'predicted_purchases_{t_values[0]}d'].sort_values(ascending=False).head(10)
-            
+        
+        # En yüksek tahmin edilen satın alımlara sahip müşteriler
+        first_horizon = predicted_purchases[f'predicted_purchases_{t_values[0]}d']
+        top_predicted = first_horizon.iloc[top_n_positions(first_horizon.to_numpy(), 10)]
+        
+        if self.plot:
             plt.figure(figsize=(10, 6))
             sns.barplot(x=top_predicted.values, y=top_predicted.index.astype(str))
             plt.title(f'En Yüksek {t_values[0]} Günlük Tahmin Edilen Satın Alma - Top 10 Müşteri')
@@ -119,23 +135,25 @@ class CLVCalculator:
             plt.ylabel('Müşteri ID')
             plt.tight_layout()
             plt.show()
-            
-            return bgf, summary, predicted_purchases_with_id
-            
-        except ImportError:
-            print("'lifetimes' paketi bulunamadı. Lütfen pip install lifetimes komutu ile yükleyin.")
-            return None, None, None
+        
+        return bgf, summary, predicted_purchases
 
 
 class BuyTillYouDieModels:
     """BG/NBD ve Gamma-Gamma modellerini kullanarak CLV tahmini yapar."""
     
-    def __init__(self, data):
+    def __init__(self, data, plot=True):
         """
         Args:
             data (pd.DataFrame): CLV hesaplaması yapılacak veri seti
+            plot (bool): Grafikler çizilsin mi; toplu/başsız çalıştırmalarda False verilir
         """
         self.data = data
+        self.plot = plot
+        # Son tarih bir kez hesaplanır
+        self._last_date = pd.Timestamp(self.data['InvoiceDate'].values.max())
+        # Müşteri özeti çekirdeğini önceden derle
+        warmup(data)
         self.bgf_model = None
         self.ggf_model = None
         self.summary = None
@@ -147,18 +165,8 @@ class BuyTillYouDieModels:
         Returns:
             pd.DataFrame: Müşteri bazında hazırlanmış RFM değerleri
         """
-        # Veri setindeki son tarih
-        last_date = self.data['InvoiceDate'].max()
-        
-        # Müşteri bazında frecency ve monetary değerleri hesapla
-        rfm = self.data.groupby('CustomerID').agg({
-            'InvoiceDate': [
-                lambda x: (last_date - x.min()).days,  # T (customer age)
-                lambda x: (last_date - x.max()).days,  # recency
-            ],
-            'InvoiceNo': lambda x: len(x.unique()),  # frequency
-            'TotalPrice': lambda x: x.sum()  # monetary value
-        })
+        # Müşteri bazında frecency ve monetary değerleri (paylaşılan müşteri özeti)
+        rfm = build_summary(self.data, self._last_date)[['T', 'recency', 'unique_invoices', 'total_spend']]
         
         # Sütun isimlerini düzenle
         rfm.columns = ['T', 'recency', 'frequency', 'monetary_value']
@@ -179,27 +187,24 @@ class BuyTillYouDieModels:
         Returns:
             lifetimes.BetaGeoFitter: Eğitilmiş BG/NBD modeli
         """
-        try:
-            from lifetimes import BetaGeoFitter
-            
-            # Veriyi hazırla
-            if self.summary is None:
-                self.prepare_transaction_data()
-            
-            # BG/NBD modelini oluştur ve eğit
-            print("BG/NBD modeli eğitiliyor...")
-            bgf = BetaGeoFitter(penalizer_coef=0.01)
-            bgf.fit(self.summary['frequency'], self.summary['recency'], self.summary['T'])
-            
-            print("\nBG/NBD Model Parametreleri:")
-            print(bgf.summary)
-            
-            self.bgf_model = bgf
-            return bgf
-            
-        except ImportError:
+        if not _HAS_LIFETIMES:
             print("'lifetimes' paketi bulunamadı. Lütfen pip install lifetimes komutu ile yükleyin.")
             return None
+        
+        # Veriyi hazırla
+        if self.summary is None:
+            self.prepare_transaction_data()
+        
+        # BG/NBD modelini oluştur ve eğit
+        print("BG/NBD modeli eğitiliyor...")
+        bgf = BetaGeoFitter(penalizer_coef=0.01)
+        bgf.fit(self.summary['frequency'], self.summary['recency'], self.summary['T'])
+        
+        print("\nBG/NBD Model Parametreleri:")
+        print(bgf.summary)
+        
+        self.bgf_model = bgf
+        return bgf
     
     def fit_gamma_gamma_model(self):
         """
@@ -208,30 +213,27 @@ class BuyTillYouDieModels:
         Returns:
             lifetimes.GammaGammaFitter: Eğitilmiş Gamma-Gamma modeli
         """
-        try:
-            from lifetimes import GammaGammaFitter
-            
-            # Veriyi hazırla
-            if self.summary is None:
-                self.prepare_transaction_data()
-            
-            # Sadece birden fazla alışveriş yapan müşterileri seç
-            ggf_summary = self.summary[self.summary['frequency'] > 0].copy()
-            
-            # Gamma-Gamma modelini oluştur ve eğit
-            print("Gamma-Gamma modeli eğitiliyor...")
-            ggf = GammaGammaFitter(penalizer_coef=0.01)
-            ggf.fit(ggf_summary['frequency'], ggf_summary['monetary_value'])
-            
-            print("\nGamma-Gamma Model Parametreleri:")
-            print(ggf.summary)
-            
-            self.ggf_model = ggf
-            return ggf
-            
-        except ImportError:
+        if not _HAS_LIFETIMES:
             print("'lifetimes' paketi bulunamadı. Lütfen pip install lifetimes komutu ile yükleyin.")
             return None
+        
+        # Veriyi hazırla
+        if self.summary is None:
+            self.prepare_transaction_data()
+        
+        # Sadece birden fazla alışveriş yapan müşterileri seç
+        ggf_summary = self.summary[self.summary['frequency'] > 0].copy()
+        
+        # Gamma-Gamma modelini oluştur ve eğit
+        print("Gamma-Gamma modeli eğitiliyor...")
+        ggf = GammaGammaFitter(penalizer_coef=0.01)
+        ggf.fit(ggf_summary['frequency'], ggf_summary['monetary_value'])
+        
+        print("\nGamma-Gamma Model Parametreleri:")
+        print(ggf.summary)
+        
+        self.ggf_model = ggf
+        return ggf
     
     def predict_customer_ltv(self, time_horizon=12, discount_rate=0.01):
         """
@@ -255,59 +257,63 @@ class BuyTillYouDieModels:
             print("Modeller eğitilemedi, CLV hesaplanamıyor.")
             return None
         
+        frequency = self.summary['frequency'].to_numpy(dtype=np.float64)
+        recency = self.summary['recency'].to_numpy(dtype=np.float64)
+        T = self.summary['T'].to_numpy(dtype=np.float64)
+        monetary_value = self.summary['monetary_value'].to_numpy(dtype=np.float64)
+        
+        # 0..time_horizon aylık kümülatif beklenen satın alma sayıları tek çağrıda (ay x müşteri)
+        horizon_days = np.arange(time_horizon + 1, dtype=np.float64)[:, None] * 30  # Gün cinsinden
+        cumulative_purchases = self.bgf_model.predict(horizon_days, frequency, recency, T)
+        
         # Gelecek 1 yıl (veya time_horizon ay) için beklenen satın alma sayısı
-        self.summary['predicted_purchases'] = self.bgf_model.predict(
-            time_horizon * 30,  # Gün cinsinden
-            self.summary['frequency'],
-            self.summary['recency'],
-            self.summary['T']
-        )
+        self.summary['predicted_purchases'] = cumulative_purchases[-1]
         
         # Beklenen ortalama sipariş değeri
         self.summary['expected_avg_value'] = self.ggf_model.conditional_expected_average_profit(
-            self.summary['frequency'],
-            self.summary['monetary_value']
+            frequency,
+            monetary_value
         )
         
-        # Müşteri yaşam boyu değeri hesaplama
-        self.summary['clv'] = self.ggf_model.customer_lifetime_value(
-            self.bgf_model,
-            self.summary['frequency'],
-            self.summary['recency'],
-            self.summary['T'],
-            self.summary['monetary_value'],
-            time=time_horizon,
-            discount_rate=discount_rate
-        )
+        # Müşteri yaşam boyu değeri hesaplama: aylık beklenen satın alma x beklenen değer, aylık iskontolu
+        # (GammaGammaFitter.customer_lifetime_value ile aynı formül, ay başına ayrı predict çağrısı olmadan)
+        monthly_purchases = np.diff(cumulative_purchases, axis=0)
+        discount = (1 + discount_rate) ** np.arange(1, time_horizon + 1, dtype=np.float64)
+        self.summary['clv'] = (
+            self.summary['expected_avg_value'].to_numpy()[None, :] * monthly_purchases / discount[:, None]
+        ).sum(axis=0)
         
         # CLV Dağılımı
-        plt.figure(figsize=(10, 6))
-        sns.histplot(self.summary['clv'].clip(0, self.summary['clv'].quantile(0.99)), bins=50)
-        plt.title(f'{time_horizon} Aylık Tahmini Müşteri Yaşam Boyu Değeri (CLV) Dağılımı')
-        plt.xlabel('Tahmini CLV')
-        plt.ylabel('Müşteri Sayısı')
-        plt.tight_layout()
-        plt.show()
+        if self.plot:
+            plt.figure(figsize=(10, 6))
+            fast_hist(self.summary['clv'].clip(0, self.summary['clv'].quantile(0.99)), bins=50)
+            plt.title(f'{time_horizon} Aylık Tahmini Müşteri Yaşam Boyu Değeri (CLV) Dağılımı')
+            plt.xlabel('Tahmini CLV')
+            plt.ylabel('Müşteri Sayısı')
+            plt.tight_layout()
+            plt.show()
         
         # En yüksek CLV'ye sahip müşteriler
-        top_clv = self.summary.sort_values('clv', ascending=False).head(10)
+        top_clv = self.summary.iloc[top_n_positions(self.summary['clv'].to_numpy(), 10)]
         
-        plt.figure(figsize=(10, 6))
-        sns.barplot(x='clv', y=top_clv.index.astype(str), data=top_clv)
-        plt.title('En Yüksek Tahmini CLV - Top 10 Müşteri')
-        plt.xlabel('Tahmini CLV')
-        plt.ylabel('Müşteri ID')
-        plt.tight_layout()
-        plt.show()
+        if self.plot:
+            plt.figure(figsize=(10, 6))
+            sns.barplot(x='clv', y=top_clv.index.astype(str), data=top_clv)
+            plt.title('En Yüksek Tahmini CLV - Top 10 Müşteri')
+            plt.xlabel('Tahmini CLV')
+            plt.ylabel('Müşteri ID')
+            plt.tight_layout()
+            plt.show()
         
         # Correlation between metrics
         correlation = self.summary[['frequency', 'recency', 'T', 'monetary_value', 
                                   'predicted_purchases', 'expected_avg_value', 'clv']].corr()
         
-        plt.figure(figsize=(10, 8))
-        sns.heatmap(correlation, annot=True, cmap='coolwarm', fmt='.2f')
-        plt.title('Müşteri Metrikleri Arasındaki Korelasyon')
-        plt.tight_layout()
-        plt.show()
+        if self.plot:
+            plt.figure(figsize=(10, 8))
+            sns.heatmap(correlation, annot=True, cmap='coolwarm', fmt='.2f')
+            plt.title('Müşteri Metrikleri Arasındaki Korelasyon')
+            plt.tight_layout()
+            plt.show()
         
         return self.summary
\ No newline at end of file
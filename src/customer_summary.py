@@ -0,0 +1,49 @@
+"""
+Müşteri bazlı özet tablosunu hesaplar ve önbellekte tutar.
+Churn ve CLV sınıfları aynı veri seti için tek bir taramayı paylaşır.
+"""
+
+import functools
+import weakref
+
+import numpy as np
+
+from src._agg_kernels import customer_aggregates
+
+# id(data) -> veri seti; veri seti silindiğinde önbellek de temizlenir
+_frames = weakref.WeakValueDictionary()
+
+
+@functools.lru_cache(maxsize=8)
+def _build_summary(data_id, last_date_ns, content_token):
+    # content_token yalnızca önbellek anahtarı içindir; yerinde düzenlenen veri yeniden hesaplanır
+    return customer_aggregates(_frames[data_id], np.datetime64(last_date_ns, 'ns'))
+
+
+def build_summary(data, last_date=None):
+    """
+    Müşteri bazlı özet tablosunu döndürür; aynı veri seti ve son tarih için bir kez hesaplanır.
+
+    Önbellek anahtarı veri setinin kimliği, son tarih ve (satır sayısı, float64 TotalPrice toplamı)
+    içerik izinden oluşur; TotalPrice toplamını değiştirmeyen yerinde düzenlemeler algılanmaz.
+
+    Args:
+        data (pd.DataFrame): Temizlenmiş işlem verisi
+        last_date: Recency ve T hesabı için son tarih. None ise veri setindeki son tarih kullanılır.
+
+    Returns:
+        pd.DataFrame: CustomerID indeksli özet tablo (T, recency, lifetime, transactions,
+            unique_invoices, total_qty, avg_qty, std_qty, total_spend, avg_spend, std_spend).
+            Önbellekteki tablonun kendisidir; değiştirilecekse kopyası alınmalıdır.
+    """
+    if last_date is None:
+        last_date = data['InvoiceDate'].values.max()
+
+    data_id = id(data)
+    if data_id not in _frames:
+        _frames[data_id] = data
+        # Aynı id'nin yeni bir veri setine verilmesi durumunda eski sonuç dönmesin
+        weakref.finalize(data, _build_summary.cache_clear)
+
+    content_token = (len(data), float(data['TotalPrice'].to_numpy().sum(dtype=np.float64)))
+    return _build_summary(data_id, int(np.datetime64(last_date, 'ns').view('i8')), content_token)
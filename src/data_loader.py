@@ -1,7 +1,26 @@
 import pandas as pd
 import urllib.request
 import zipfile
-import io
+import shutil
+import tempfile
+import os
+
+from src.data_preprocessor import DataPreprocessor
+
+try:
+    import python_calamine  # noqa: F401
+    # Rust tabanlı xlsx okuyucu; openpyxl'den çok daha hızlı
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = None
+
+try:
+    import pyarrow  # noqa: F401
+    _HAS_PYARROW = True
+except ImportError:
+    _HAS_PYARROW = False
+
+DATASET_URL = "https://archive.ics.uci.edu/ml/machine-learning-databases/00352/Online%20Retail.zip"
 
 class DataLoader:
     """Veri setini yükleme ve hazırlama işlemlerini yönetir."""
@@ -11,30 +30,67 @@ class DataLoader:
         print("Veri seti indiriliyor...")
         
         try:
-            response = urllib.request.urlopen(url)
-            zip_data = io.BytesIO(response.read())
-            
-            with zipfile.ZipFile(zip_data) as zip_ref:
-                file_list = zip_ref.namelist()
-                excel_files = [f for f in file_list if f.endswith('.xlsx')]
+            # ZIP'i belleğe almadan parça parça diske yaz, excel dosyasını diske çıkar
+            with tempfile.TemporaryDirectory() as extract_dir:
+                zip_path = os.path.join(extract_dir, 'data.zip')
+                with urllib.request.urlopen(url) as response, open(zip_path, 'wb') as f:
+                    shutil.copyfileobj(response, f, length=1 << 20)
+                
+                with zipfile.ZipFile(zip_path) as zip_ref:
+                    file_list = zip_ref.namelist()
+                    excel_files = [f for f in file_list if f.endswith('.xlsx')]
+                    
+                    if excel_files:
+                        excel_file = excel_files[0]
+                        extract_path = zip_ref.extract(excel_file, extract_dir)
+                    else:
+                        print("ZIP dosyasında excel dosyası bulunamadı.")
+                        return None
                 
-                if excel_files:
-                    excel_file = excel_files[0]
-                    with zip_ref.open(excel_file) as f:
-                        data = pd.read_excel(io.BytesIO(f.read()))
-                    print(f"Veri seti başarıyla yüklendi: {excel_file}")
-                    return data
-                else:
-                    print("ZIP dosyasında excel dosyası bulunamadı.")
-                    return None
+                data = pd.read_excel(extract_path, engine=EXCEL_ENGINE)
+                print(f"Veri seti başarıyla yüklendi: {excel_file}")
+                return data
         except Exception as e:
             print(f"Veri seti indirme hatası: {e}")
             try:
                 direct_url = "https://archive.ics.uci.edu/ml/machine-learning-databases/00352/Online%20Retail.xlsx"
                 print("Alternatif yol deneniyor...")
-                data = pd.read_excel(direct_url)
+                data = pd.read_excel(direct_url, engine=EXCEL_ENGINE)
                 print("Veri seti başarıyla yüklendi")
                 return data
             except Exception as e2:
                 print(f"Alternatif yol hatası: {e2}")
                 return None
+    
+    @staticmethod
+    def load_cached(cache_path='data/online_retail.parquet', url=DATASET_URL):
+        """
+        Temizlenmiş veri setini Parquet önbelleğinden yükler; önbellek yoksa indirip temizler ve kaydeder.
+        
+        Args:
+            cache_path (str): Temizlenmiş verinin saklanacağı Parquet dosyası
+            url (str): Önbellek yoksa indirilecek veri seti adresi
+            
+        Returns:
+            pd.DataFrame: Temizlenmiş ve veri tipleri küçültülmüş veri seti
+        """
+        if _HAS_PYARROW and os.path.exists(cache_path):
+            print(f"Temizlenmiş veri önbellekten yükleniyor: {cache_path}")
+            data = pd.read_parquet(cache_path, engine='pyarrow')
+            # Tamsayı kategoriler Parquet'ten düz int32 olarak döner; kategorik tip geri verilir
+            if not isinstance(data['CustomerID'].dtype, pd.CategoricalDtype):
+                data['CustomerID'] = data['CustomerID'].astype('category')
+            return data
+        
+        data = DataLoader.download_and_extract(url)
+        if data is None:
+            return None
+        data = DataPreprocessor.clean_data(data)
+        
+        if _HAS_PYARROW:
+            os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+            data.to_parquet(cache_path, engine='pyarrow', compression='snappy')
+            print(f"Temizlenmiş veri önbelleğe kaydedildi: {cache_path}")
+        else:
+            print("pyarrow paketi bulunamadı, önbellek kaydedilmedi. Lütfen pip install pyarrow komutu ile yükleyin.")
+        return data
\ No newline at end of file
@@ -2,6 +2,7 @@
 Veri ön işleme işlemlerini gerçekleştirir.
 """
 
+import numpy as np
 import pandas as pd
 
 
@@ -13,33 +14,58 @@ class DataPreprocessor:
         """Veri setini temizler ve ön işleme adımlarını uygular."""
         print("Veri seti temizleniyor...")
         
-        # Veri seti kopyasını oluştur
-        df = data.copy()
-        
         # Eksik değerleri kontrol et
-        missing_values = df.isnull().sum()
+        missing_values = data.isnull().sum()
         print(f"Eksik değerler:\n{missing_values}")
         
-        # CustomerID olmayan kayıtları çıkar
-        df = df[~df['CustomerID'].isna()]
-        
-        # Negatif veya sıfır miktarlı işlemleri çıkar
-        df = df[df['Quantity'] > 0]
-        
-        # Negatif fiyatlı işlemleri çıkar
-        df = df[df['UnitPrice'] > 0]
+        # İptal kontrolü satırlar yerine InvoiceNo kategorileri üzerinde bir kez yapılır
+        invoice_no = data['InvoiceNo'].astype('category')
+        invoice_categories = invoice_no.cat.categories
+        category_is_cancelled = np.array(
+            [isinstance(c, str) and c.startswith('C') for c in invoice_categories], dtype=bool
+        )
+        invoice_codes = invoice_no.cat.codes.to_numpy()
+        not_cancelled = (invoice_codes < 0) | ~category_is_cancelled[invoice_codes]
         
-        # İptal işlemlerini çıkar (InvoiceNo C ile başlayanlar)
-        df = df[~df['InvoiceNo'].astype(str).str.startswith('C')]
+        # Tüm filtre koşullarını tek bir maske altında birleştir
+        mask = (
+            data['CustomerID'].notna().to_numpy()  # CustomerID olmayan kayıtları çıkar
+            & (data['Quantity'].to_numpy() > 0)  # Negatif veya sıfır miktarlı işlemleri çıkar
+            & (data['UnitPrice'].to_numpy() > 0)  # Negatif fiyatlı işlemleri çıkar
+            & not_cancelled  # İptal işlemlerini çıkar (InvoiceNo C ile başlayanlar)
+        )
+        # Filtrelenmiş satırların tek kopyası; girdi veri seti değiştirilmez
+        df = data.loc[mask].copy()
         
-        # CustomerID'yi integer'a çevir
-        df['CustomerID'] = df['CustomerID'].astype(int)
+        # CustomerID'yi integer'a çevir (5 haneli ID'ler int32'ye sığar) ve kategorik yap;
+        # tüm CustomerID groupby'ları tamsayı kodlar üzerinden çalışır
+        df['CustomerID'] = df['CustomerID'].astype('int32').astype('category')
         
         # InvoiceDate'i datetime formatına çevir
         df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
         
         # Toplam tutar hesapla
-        df['TotalPrice'] = df['Quantity'] * df['UnitPrice']
+        total_price = np.empty(len(df), dtype=np.float32)
+        np.multiply(df['Quantity'].to_numpy(), df['UnitPrice'].to_numpy(), out=total_price)
+        df['TotalPrice'] = total_price
+        
+        # Küçültülen tiplerin taşmadığını doğrula (float32 taşması inf üretir)
+        if (np.abs(df['Quantity'].to_numpy()).max(initial=0) > np.iinfo(np.int32).max
+                or not np.isfinite(total_price).all()):
+            raise ValueError("Quantity/TotalPrice değerleri int32/float32 aralığına sığmıyor.")
+        
+        # Veri tiplerini küçült: int32 miktar, float32 fiyat, kategorik metin sütunları
+        df['Quantity'] = df['Quantity'].astype('int32')
+        df['UnitPrice'] = df['UnitPrice'].astype('float32')
+        # InvoiceNo kodları yeniden kullanılır; karışık int/str kategoriler str'ye indirgenir
+        category_labels, str_categories = pd.factorize(invoice_categories.astype(str))
+        kept_codes = invoice_codes[mask]
+        df['InvoiceNo'] = pd.Categorical.from_codes(
+            np.where(kept_codes < 0, -1, category_labels[kept_codes]), categories=str_categories
+        ).remove_unused_categories()
+        df['StockCode'] = df['StockCode'].astype(str).astype('category')
+        for col in ('Country', 'Description'):
+            df[col] = df[col].astype('category')
         
         print(f"Veri seti temizlendi. Yeni boyut: {df.shape}")
         return df
\ No newline at end of file
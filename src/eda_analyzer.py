@@ -2,11 +2,14 @@
 Keşifsel veri analizi işlemlerini gerçekleştirir.
 """
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import warnings
 
+from src._array_utils import top_n_positions
+
 # Grafik görüntüleme ayarları
 plt.style.use('seaborn-v0_8-whitegrid')
 plt.rcParams['figure.figsize'] = (12, 8)
@@ -16,12 +19,14 @@ warnings.filterwarnings('ignore')
 class EDAAnalyzer:
     """Keşifsel veri analizi işlemlerini gerçekleştirir."""
     
-    def __init__(self, data):
+    def __init__(self, data, plot=True):
         """
         Args:
             data (pd.DataFrame): Analiz edilecek veri seti
+            plot (bool): Grafikler çizilsin mi; toplu/başsız çalıştırmalarda False verilir
         """
         self.data = data
+        self.plot = plot
     
     def show_basic_info(self):
         """Veri seti hakkında temel bilgileri gösterir."""
@@ -38,63 +43,82 @@ class EDAAnalyzer:
     
     def analyze_temporal_patterns(self):
         """Zamansal desenleri analiz eder."""
-        # Günlük işlem sayısı 
-        daily_transactions = self.data.groupby(self.data['InvoiceDate'].dt.date).size()
+        # Tarih ve saatleri tamsayı kodlara indirger; sayımlar np.bincount ile yapılır
+        timestamps = self.data['InvoiceDate'].values
+        day_idx = timestamps.astype('datetime64[D]').view('i8')
+        hour_idx = timestamps.astype('datetime64[h]').view('i8') % 24
+        
+        # Günlük işlem sayısı (yalnızca işlem olan günler)
+        first_day = day_idx.min()
+        daily_counts = np.bincount(day_idx - first_day)
+        active_days = np.flatnonzero(daily_counts)
+        daily_transactions = pd.Series(
+            daily_counts[active_days],
+            index=pd.Index((active_days + first_day).astype('datetime64[D]'), name='InvoiceDate')
+        )
         
-        plt.figure(figsize=(12, 6))
-        daily_transactions.plot()
-        plt.title('Günlük İşlem Sayısı', fontsize=14)
-        plt.xlabel('Tarih')
-        plt.ylabel('İşlem Sayısı')
-        plt.tight_layout()
-        plt.show()
+        if self.plot:
+            plt.figure(figsize=(12, 6))
+            daily_transactions.plot()
+            plt.title('Günlük İşlem Sayısı', fontsize=14)
+            plt.xlabel('Tarih')
+            plt.ylabel('İşlem Sayısı')
+            plt.tight_layout()
+            plt.show()
         
-        # Haftanın günlerine göre analiz
-        self.data['DayOfWeek'] = self.data['InvoiceDate'].dt.day_name()
+        # Haftanın günlerine göre analiz (1970-01-01 Perşembe olduğundan +3 ile Pazartesi=0)
         day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+        day_counts = pd.Series(np.bincount((day_idx + 3) % 7, minlength=7), index=day_order)
         
-        plt.figure(figsize=(10, 6))
-        day_counts = self.data['DayOfWeek'].value_counts().reindex(day_order)
-        sns.barplot(x=day_counts.index, y=day_counts.values)
-        plt.title('Haftanın Günlerine Göre İşlem Sayısı', fontsize=14)
-        plt.xlabel('Gün')
-        plt.ylabel('İşlem Sayısı')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.show()
+        if self.plot:
+            plt.figure(figsize=(10, 6))
+            sns.barplot(x=day_counts.index, y=day_counts.values)
+            plt.title('Haftanın Günlerine Göre İşlem Sayısı', fontsize=14)
+            plt.xlabel('Gün')
+            plt.ylabel('İşlem Sayısı')
+            plt.xticks(rotation=45)
+            plt.tight_layout()
+            plt.show()
         
         # Saatlere göre analiz
-        self.data['Hour'] = self.data['InvoiceDate'].dt.hour
+        hour_counts = np.bincount(hour_idx, minlength=24)
+        active_hours = np.flatnonzero(hour_counts)
+        hour_counts = pd.Series(hour_counts[active_hours], index=active_hours)
         
-        plt.figure(figsize=(12, 6))
-        hour_counts = self.data['Hour'].value_counts().sort_index()
-        sns.barplot(x=hour_counts.index, y=hour_counts.values)
-        plt.title('Saatlere Göre İşlem Sayısı', fontsize=14)
-        plt.xlabel('Saat')
-        plt.ylabel('İşlem Sayısı')
-        plt.tight_layout()
-        plt.show()
+        if self.plot:
+            plt.figure(figsize=(12, 6))
+            sns.barplot(x=hour_counts.index, y=hour_counts.values)
+            plt.title('Saatlere Göre İşlem Sayısı', fontsize=14)
+            plt.xlabel('Saat')
+            plt.ylabel('İşlem Sayısı')
+            plt.tight_layout()
+            plt.show()
     
     def analyze_top_countries(self):
         """En çok işlem yapılan ülkeleri analiz eder."""
-        country_counts = self.data['Country'].value_counts().head(10)
+        # Tam sıralama yerine yalnızca ilk 10 seçilir
+        country_counts = self.data['Country'].value_counts(sort=False)
+        country_counts = country_counts.iloc[top_n_positions(country_counts.to_numpy(), 10)]
         
-        plt.figure(figsize=(12, 6))
-        sns.barplot(x=country_counts.values, y=country_counts.index)
-        plt.title('En Çok İşlem Yapılan 10 Ülke', fontsize=14)
-        plt.xlabel('İşlem Sayısı')
-        plt.ylabel('Ülke')
-        plt.tight_layout()
-        plt.show()
+        if self.plot:
+            plt.figure(figsize=(12, 6))
+            sns.barplot(x=country_counts.values, y=country_counts.index.astype(str))
+            plt.title('En Çok İşlem Yapılan 10 Ülke', fontsize=14)
+            plt.xlabel('İşlem Sayısı')
+            plt.ylabel('Ülke')
+            plt.tight_layout()
+            plt.show()
     
     def analyze_top_products(self):
         """En çok satılan ürünleri analiz eder."""
-        product_quantity = self.data.groupby('Description')['Quantity'].sum().sort_values(ascending=False).head(10)
+        product_quantity = self.data.groupby('Description', observed=True)['Quantity'].sum()
+        product_quantity = product_quantity.iloc[top_n_positions(product_quantity.to_numpy(), 10)]
         
-        plt.figure(figsize=(12, 6))
-        sns.barplot(x=product_quantity.values, y=product_quantity.index)
-        plt.title('En Çok Satılan 10 Ürün (Miktar)', fontsize=14)
-        plt.xlabel('Satış Miktarı')
-        plt.ylabel('Ürün')
-        plt.tight_layout()
-        plt.show()
\ No newline at end of file
+        if self.plot:
+            plt.figure(figsize=(12, 6))
+            sns.barplot(x=product_quantity.values, y=product_quantity.index.astype(str))
+            plt.title('En Çok Satılan 10 Ürün (Miktar)', fontsize=14)
+            plt.xlabel('Satış Miktarı')
+            plt.ylabel('Ürün')
+            plt.tight_layout()
+            plt.show()
\ No newline at end of file
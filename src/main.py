@@ -3,25 +3,24 @@ Online Retail CRM Analytics - Ana Uygulama
 Bu dosya tüm analiz süreçlerini koordine eder ve ana akışı yönetir.
 """
 
+import functools
+import hashlib
+import inspect
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import seaborn as sns
 import warnings
-import sys
 import os
 
-# Kendi modüllerimizi import et
-from src.data_loader import DataLoader
-from src.data_preprocessor import DataPreprocessor
-from src.eda_analyzer import EDAAnalyzer
-from src.rfm_analyzer import RFMAnalyzer
-from src.clv_calculator import CLVCalculator, BuyTillYouDieModels
-from src.churn_analyzer import CustomerChurnAnalyzer
+# Kendi modüllerimizi import et (analiz sınıfları sklearn/lifetimes yüklediğinden main() içinde import edilir)
+from src.data_loader import DATASET_URL, DataLoader
 
-# Grafik görüntüleme ayarları
-plt.style.use('seaborn-v0_8-whitegrid')
-plt.rcParams['figure.figsize'] = (12, 8)
-warnings.filterwarnings('ignore')
+try:
+    import pyarrow  # noqa: F401
+    # Aşama önbelleği Parquet yazıp okumak için pyarrow gerektirir
+    _HAS_PYARROW = True
+except ImportError:
+    _HAS_PYARROW = False
 
 # Çalışma dizinini ayarla
 def print_header(title):
@@ -31,14 +30,110 @@ def print_header(title):
     print("="*60)
 
 
+CACHE_DIR = 'cache'
+
+
+def data_fingerprint(data, *params):
+    """
+    Veri setinin (boyut, CustomerID toplamı, TotalPrice toplamı) parmak izinden önbellek anahtarı üretir.
+    
+    Args:
+        data (pd.DataFrame): Temizlenmiş veri seti
+        *params: Anahtara eklenecek aşama parametreleri
+        
+    Returns:
+        str: 16 karakterlik blake2b özeti
+    """
+    fingerprint = (
+        data.shape,
+        int(data['CustomerID'].to_numpy().astype(np.int64).sum()),
+        float(data['TotalPrice'].to_numpy().sum(dtype=np.float64)),
+        params
+    )
+    return hashlib.blake2b(repr(fingerprint).encode(), digest_size=8).hexdigest()
+
+
+def _stage_params(fn, args, kwargs):
+    """
+    Aşama çağrısını imzaya bağlayıp varsayılanlar dahil parametreleri (ad, değer) listesi olarak döndürür.
+    
+    Analiz sınıfları ve DataFrame'ler atlanır; veri seti anahtara parmak iziyle girer.
+    
+    Args:
+        fn: Önbelleğe alınan aşama fonksiyonu
+        args (tuple): Konumsal argümanlar
+        kwargs (dict): Anahtar kelime argümanları
+        
+    Returns:
+        list: Ada göre sıralı (ad, değer) çiftleri
+    """
+    bound = inspect.signature(fn).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return sorted(
+        (name, value) for name, value in bound.arguments.items()
+        if not isinstance(value, pd.DataFrame)
+        and not isinstance(getattr(value, 'data', None), pd.DataFrame)
+    )
+
+
+def cached_parquet(key_fn, cache_dir=CACHE_DIR, index_dtype=None):
+    """
+    DataFrame döndüren bir aşamanın sonucunu Parquet olarak önbelleğe alan dekoratör.
+    
+    Aynı anahtarla önbellek dosyası varsa aşama çalıştırılmadan dosya okunur. None sonuçlar
+    önbelleğe yazılmaz; pyarrow yoksa aşama her seferinde çalıştırılır.
+    
+    Args:
+        key_fn: Aşamanın (ad, değer) parametre listesini alıp önbellek anahtarı döndüren fonksiyon
+        cache_dir (str): Önbellek dosyalarının klasörü
+        index_dtype: Okunan sonucun indeksine geri verilecek tip (ör. kategorik CustomerID).
+            Kategorik indeks Parquet'ten düz tamsayı olarak döner.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _HAS_PYARROW:
+                return fn(*args, **kwargs)
+            
+            key = key_fn(_stage_params(fn, args, kwargs))
+            path = os.path.join(cache_dir, f"{fn.__name__}_{key}.parquet")
+            if os.path.exists(path):
+                print(f"♻️ {fn.__name__} sonucu önbellekten okunuyor: {path}")
+                result = pd.read_parquet(path, engine='pyarrow')
+                if index_dtype is not None and result.index.dtype != index_dtype:
+                    result.index = pd.CategoricalIndex(result.index, dtype=index_dtype, name=result.index.name)
+                return result
+            
+            result = fn(*args, **kwargs)
+            if result is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                result.to_parquet(path, engine='pyarrow', compression='zstd')
+            return result
+        return wrapper
+    return decorator
+
+
+def predict_clv(btyd_models, time_horizon=12):
+    """BG/NBD ve Gamma-Gamma modellerini eğitip CLV tahmini yapar; modeller eğitilemezse None döner"""
+    btyd_models.prepare_transaction_data()
+    bgf = btyd_models.fit_bgnbd_model()
+    ggf = btyd_models.fit_gamma_gamma_model()
+    
+    if bgf is None or ggf is None:
+        return None
+    return btyd_models.predict_customer_ltv(time_horizon=time_horizon)
+
+
 def print_summary_metrics(data, churn_data=None):
     """Özet metriklerini yazdırır"""
     print_header("ÖZET METRİKLER")
     
-    # Temel metrikler
-    total_customers = data['CustomerID'].nunique()
-    total_revenue = data['TotalPrice'].sum()
-    total_orders = data['InvoiceNo'].nunique()
+    # Temel metrikler tek bir agg çağrısıyla hesaplanır
+    metrics = data.agg({'CustomerID': 'nunique', 'InvoiceNo': 'nunique'})
+    total_customers = int(metrics['CustomerID'])
+    total_orders = int(metrics['InvoiceNo'])
+    # TotalPrice float32 tutulduğundan toplam float64 biriktirilir (kuruş hassasiyeti)
+    total_revenue = float(data['TotalPrice'].to_numpy().sum(dtype=np.float64))
     avg_order_value = total_revenue / total_orders
     
     print(f"📊 Toplam Müşteri Sayısı: {total_customers:,}")
@@ -48,73 +143,80 @@ def print_summary_metrics(data, churn_data=None):
     
     # Churn metrikleri
     if churn_data is not None:
-        active_customers = (~churn_data['IsChurned']).sum()
-        churn_rate = churn_data['IsChurned'].mean()
+        is_churned = np.asarray(churn_data['IsChurned'], dtype=np.bool_)
+        churned_customers = int(is_churned.sum())
+        active_customers = is_churned.size - churned_customers
+        churn_rate = churned_customers / is_churned.size
         print(f"✅ Aktif Müşteri Sayısı: {active_customers:,} ({1-churn_rate:.2%})")
         print(f"⚠️  Churn Oranı: {churn_rate:.2%}")
 
 
-def segment_clv_comparison(clv_predictions, rfm_segments):
-    """Segment ve CLV karşılaştırması yapar"""
+def segment_clv_comparison(clv_predictions, rfm_segments, plot=True):
+    """Segment ve CLV karşılaştırması yapar; plot=False ise yalnızca özet yazdırılır"""
     if clv_predictions is not None and rfm_segments is not None:
         print_header("SEGMENT - CLV KARŞILAŞTIRMASI")
         
-        # CLV ve segment bilgilerini birleştir
-        segment_clv = pd.merge(
-            clv_predictions, 
-            rfm_segments[['Segment']], 
-            left_index=True, 
-            right_index=True
+        # CLV ve segment bilgilerini birleştir (her iki tablo da CustomerID indeksli)
+        segment_clv = clv_predictions.assign(
+            Segment=rfm_segments['Segment'].reindex(clv_predictions.index)
         )
         
         # Segmente göre ortalama CLV
-        segment_clv_avg = segment_clv.groupby('Segment')['clv'].mean().sort_values(ascending=False)
+        segment_clv_avg = segment_clv.groupby('Segment', observed=True)['clv'].mean().sort_values(ascending=False)
         
         print("Segmentlere Göre Ortalama CLV:")
-        for segment, avg_clv in segment_clv_avg.items():
-            print(f"  {segment}: £{avg_clv:.2f}")
+        print(segment_clv_avg.map('£{:.2f}'.format).to_string())
         
         # Görselleştirme
-        plt.figure(figsize=(12, 6))
-        sns.barplot(x=segment_clv_avg.index, y=segment_clv_avg.values)
-        plt.title('Segmentlere Göre Ortalama Müşteri Yaşam Boyu Değeri (CLV)', fontsize=14)
-        plt.xlabel('Segment')
-        plt.ylabel('Ortalama CLV (£)')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.show()
-
-
-def main():
-    """Ana uygulama fonksiyonu"""
+        if plot:
+            fig, ax = plt.subplots(figsize=(12, 6))
+            ax.bar(segment_clv_avg.index.astype(str), segment_clv_avg.to_numpy())
+            ax.set_title('Segmentlere Göre Ortalama Müşteri Yaşam Boyu Değeri (CLV)', fontsize=14)
+            ax.set_xlabel('Segment')
+            ax.set_ylabel('Ortalama CLV (£)')
+            ax.tick_params(axis='x', labelrotation=45)
+            fig.tight_layout()
+            plt.show()
+
+
+def main(plot=True):
+    """
+    Ana uygulama fonksiyonu
+    
+    Args:
+        plot (bool): Grafikler çizilsin mi; toplu/başsız çalıştırmalarda False verilir
+    """
+    from src.eda_analyzer import EDAAnalyzer
+    from src.rfm_analyzer import RFMAnalyzer
+    from src.clv_calculator import CLVCalculator, BuyTillYouDieModels
+    from src.churn_analyzer import CustomerChurnAnalyzer
+    
+    # Grafik görüntüleme ayarları
+    plt.style.use('seaborn-v0_8-whitegrid')
+    plt.rcParams['figure.figsize'] = (12, 8)
+    warnings.filterwarnings('ignore')
     
     print_header("ONLINE RETAIL CRM ANALİTİKS")
     print("🚀 Müşteri Davranışı Analizi ve BG/NBD Modeli ile CLV Tahmini")
     print("📊 Veri Seti: UCI Online Retail Dataset")
     
     try:
-        # 1. VERİ YÜKLEME
-        print_header("1. VERİ YÜKLEME")
-        url = "https://archive.ics.uci.edu/ml/machine-learning-databases/00352/Online%20Retail.zip"
-        raw_data = DataLoader.download_and_extract(url)
+        # 1-2. VERİ YÜKLEME VE TEMİZLEME
+        # İlk çalıştırmada veri indirilip temizlenir ve Parquet olarak saklanır;
+        # sonraki çalıştırmalar excel okuma ve temizleme adımlarını atlar
+        print_header("1-2. VERİ YÜKLEME VE TEMİZLEME")
+        clean_data = DataLoader.load_cached('data/online_retail.parquet', url=DATASET_URL)
 
-        if raw_data is None:
+        if clean_data is None:
             print("❌ Veri seti yüklenemedi. Program sonlandırılıyor.")
             return
-
-        print(f"✅ Veri seti başarıyla yüklendi: {raw_data.shape[0]} satır, {raw_data.shape[1]} sütun")
         
-        # 2. VERİ TEMİZLEME
-        print_header("2. VERİ TEMİZLEME")
-        preprocessor = DataPreprocessor()
-        clean_data = preprocessor.clean_data(raw_data)
-        
-        print(f"✅ Veri temizleme tamamlandı")
+        print("✅ Veri yükleme ve temizleme tamamlandı")
         print(f"📊 Temizlenmiş veri boyutu: {clean_data.shape[0]} satır, {clean_data.shape[1]} sütun")
         
         # 3. KEŞİFSEL VERİ ANALİZİ (EDA)
         print_header("3. KEŞİFSEL VERİ ANALİZİ")
-        eda = EDAAnalyzer(clean_data)
+        eda = EDAAnalyzer(clean_data, plot=plot)
         
         print("📈 Temel veri özeti:")
         eda.show_basic_info()
@@ -130,8 +232,13 @@ def main():
         
         # 4. RFM ANALİZİ
         print_header("4. RFM ANALİZİ VE MÜŞTERİ SEGMENTASYONU")
-        rfm_analyzer = RFMAnalyzer(clean_data)
-        rfm_data = rfm_analyzer.calculate_rfm()
+        # Aşama sonuçları aynı veri seti için Parquet önbelleğinden okunur (anahtar: veri parmak izi + parametreler)
+        def stage_key(params):
+            return data_fingerprint(clean_data, params)
+        
+        rfm_analyzer = RFMAnalyzer(clean_data, plot=plot)
+        rfm_data = cached_parquet(stage_key, index_dtype=clean_data['CustomerID'].dtype)(rfm_analyzer.calculate_rfm)()
+        rfm_analyzer.rfm = rfm_data
         rfm_segments = rfm_analyzer.segment_customers()
         rfm_analyzer.visualize_segments()
         
@@ -139,11 +246,11 @@ def main():
         
         # 5. CHURN ANALİZİ
         print_header("5. MÜŞTERİ KAYBI (CHURN) ANALİZİ")
-        churn_analyzer = CustomerChurnAnalyzer(clean_data)
+        churn_analyzer = CustomerChurnAnalyzer(clean_data, plot=plot)
         churn_data = churn_analyzer.define_churn(inactivity_threshold=90)
         
         print("📊 Churn prediction özellikleri hazırlanıyor...")
-        churn_features = churn_analyzer.churn_prediction_features()
+        churn_features = cached_parquet(stage_key)(churn_analyzer.churn_prediction_features)()
         
         print("🤖 Churn prediction modeli eğitiliyor...")
         churn_model, X_test, y_test, feature_importances = churn_analyzer.train_churn_model(churn_features)
@@ -158,20 +265,15 @@ def main():
         
         # Basit CLV hesaplayıcısı
         print("📊 Basit CLV hesaplaması...")
-        clv_calculator = CLVCalculator(clean_data)
+        clv_calculator = CLVCalculator(clean_data, plot=plot)
         bgf_model, summary, predicted_purchases = clv_calculator.fit_bgnbd_model()
         
         # Gelişmiş BTYD modelleri
         print("🧮 Gelişmiş BG/NBD ve Gamma-Gamma modelleri...")
-        btyd_models = BuyTillYouDieModels(clean_data)
-        btyd_summary = btyd_models.prepare_transaction_data()
-        
-        bgf = btyd_models.fit_bgnbd_model()
-        ggf = btyd_models.fit_gamma_gamma_model()
+        btyd_models = BuyTillYouDieModels(clean_data, plot=plot)
+        clv_predictions = cached_parquet(stage_key)(predict_clv)(btyd_models, time_horizon=12)
         
-        clv_predictions = None
-        if bgf is not None and ggf is not None:
-            clv_predictions = btyd_models.predict_customer_ltv(time_horizon=12)
+        if clv_predictions is not None:
             print("✅ CLV tahmini tamamlandı")
         else:
             print("⚠️ CLV modelleri eğitilemedi (lifetimes paketi gerekli)")
@@ -183,7 +285,7 @@ def main():
         print_summary_metrics(clean_data, churn_data)
         
         # Segment-CLV karşılaştırması
-        segment_clv_comparison(clv_predictions, rfm_segments)
+        segment_clv_comparison(clv_predictions, rfm_segments, plot=plot)
         
         # 8. ÖNERİLER VE AKSİYON PLANLARİ
         print_header("8. İŞ ÖNERİLERİ VE AKSİYON PLANLARI")
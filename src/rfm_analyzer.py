@@ -2,28 +2,76 @@
 RFM (Recency, Frequency, Monetary) analizi işlemlerini gerçekleştirir.
 """
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import seaborn as sns
 from math import pi
+import os
 import warnings
 
+from src._agg_kernels import NS_PER_DAY, SEGMENT_LABELS, label_segments
+from src._array_utils import integer_codes
+
+try:
+    import polars as pl
+    _HAS_POLARS = True
+except ImportError:
+    _HAS_POLARS = False
+
 # Grafik görüntüleme ayarları
 plt.style.use('seaborn-v0_8-whitegrid')
 warnings.filterwarnings('ignore')
 
 
+def _score(values, bins, reverse=False):
+    """
+    Değerleri eşit frekanslı dilimlere ayırıp 1..bins arası int8 skor verir (pd.qcut ile aynı sınırlar).
+    
+    Args:
+        values (array-like): Skorlanacak değerler
+        bins (int): Dilim sayısı
+        reverse (bool): True ise düşük değerler yüksek skor alır (Recency)
+    
+    Returns:
+        np.ndarray: int8 skorlar
+    """
+    values = np.asarray(values, dtype=np.float64)
+    edges = np.quantile(values, np.linspace(0, 1, bins + 1))
+    # Tekrarlanan sınırlar (ör. çok sayıda tek alışverişli müşteri) birleştirilir; dilim sayısı azalır
+    if (np.diff(edges) == 0).any():
+        edges = np.unique(edges)
+    n_bins = len(edges) - 1
+    # Tüm değerler aynıysa tek dilim kalmaz; herkes en düşük skoru alır
+    if n_bins < 1:
+        return np.ones(len(values), dtype=np.int8)
+    # qcut gibi sağdan kapalı aralıklar: sınıra eşit değer alt dilimde kalır
+    codes = np.searchsorted(edges[1:-1], values, side='left').astype(np.int8) + 1
+    if reverse:
+        codes = (n_bins + 1 - codes).astype(np.int8)
+    return codes
+
+
 class RFMAnalyzer:
     """RFM (Recency, Frequency, Monetary) analizi işlemlerini gerçekleştirir."""
     
-    def __init__(self, data):
+    def __init__(self, data, plot=True):
         """
         Args:
             data (pd.DataFrame): RFM analizi yapılacak veri seti
+            plot (bool): Grafikler çizilsin mi; toplu/başsız çalıştırmalarda False verilir
         """
         self.data = data
+        self.plot = plot
         self.rfm = None
         self.rfm_segments = None
+        self._gb = None
+    
+    @property
+    def gb(self):
+        """CustomerID bazlı groupby nesnesi; ilk kullanımda bir kez oluşturulur."""
+        if self._gb is None:
+            self._gb = self.data.groupby('CustomerID', sort=False, observed=True)
+        return self._gb
     
     def calculate_rfm(self, reference_date=None):
         """
@@ -33,26 +81,93 @@ class RFMAnalyzer:
             reference_date: RFM hesabı için referans tarihi. None ise veri setindeki en son tarih kullanılır.
         
         Returns:
-            pd.DataFrame: RFM metrikleri hesaplanmış veri seti
+            pd.DataFrame: CustomerID indeksli RFM metrikleri (Recency, Frequency, Monetary)
         """
         # Referans tarihi belirleme (belirtilmemişse veri setindeki son tarihten 1 gün sonrası)
         if reference_date is None:
-            reference_date = self.data['InvoiceDate'].max() + pd.Timedelta(days=1)
+            reference_date = self.data['InvoiceDate'].to_numpy().max() + np.timedelta64(1, 'D')
+        reference_date = np.datetime64(reference_date, 'ns')
         
-        # Her müşteri için RFM değerlerini hesapla
-        rfm_data = self.data.groupby('CustomerID').agg({
-            'InvoiceDate': lambda x: (reference_date - x.max()).days,  # Recency
-            'InvoiceNo': 'nunique',  # Frequency
-            'TotalPrice': 'sum'  # Monetary
-        }).reset_index()
-        
-        # Sütun isimlerini güncelle
-        rfm_data.columns = ['CustomerID', 'Recency', 'Frequency', 'Monetary']
+        # Polars kuruluysa gruplama çok çekirdekli çalışır; değilse pandas yolu kullanılır
+        if _HAS_POLARS:
+            rfm_data = self._calculate_rfm_polars(reference_date)
+        else:
+            # Her müşteri için son alışveriş tarihi ve toplam harcama (isimli toplamalar; grup başına Python çağrısı yok)
+            rfm_data = self.gb.agg(
+                last_purchase=('InvoiceDate', 'max'),
+                Monetary=('TotalPrice', 'sum')
+            )
+            
+            # Frequency: (müşteri, fatura) çiftleri bir kez tekilleştirilir, ardından müşteri başına sayılır
+            frequency = (
+                self.data[['CustomerID', 'InvoiceNo']]
+                .drop_duplicates()
+                .groupby('CustomerID', sort=False, observed=True)
+                .size()
+            )
+            
+            # Recency son alışveriş tarihlerinin datetime64 dizisi üzerinden tek seferde hesaplanır
+            last_purchase = rfm_data.pop('last_purchase').to_numpy(dtype='datetime64[ns]')
+            rfm_data.insert(0, 'Recency', ((reference_date - last_purchase) // np.timedelta64(1, 'D')).astype(np.int32))
+            rfm_data.insert(1, 'Frequency', frequency.reindex(rfm_data.index).to_numpy(dtype=np.int32))
+            rfm_data['Monetary'] = rfm_data['Monetary'].astype('float32')
         
         self.rfm = rfm_data
         print("RFM metrikleri hesaplandı.")
         return rfm_data
     
+    def _calculate_rfm_polars(self, reference_date):
+        """
+        RFM metriklerini Polars LazyFrame sorgusuyla hesaplar.
+        
+        Yalnızca gereken dört sütun tamsayı kodlar ve NumPy dizileri olarak aktarılır (pyarrow gerekmez);
+        sonuç pandas DataFrame olarak döner.
+        
+        Args:
+            reference_date (np.datetime64): Recency hesabı için referans tarihi
+        
+        Returns:
+            pd.DataFrame: CustomerID indeksli RFM metrikleri (Recency, Frequency, Monetary)
+        """
+        customer_ids = self.data['CustomerID']
+        cid, cid_labels = integer_codes(customer_ids, sort=True)
+        inv_codes, _ = integer_codes(self.data['InvoiceNo'])
+        
+        frame = pl.DataFrame({
+            'CustomerID': cid,
+            'InvoiceNo': inv_codes,
+            'InvoiceDate': self.data['InvoiceDate'].to_numpy(dtype='datetime64[ns]').view('i8'),
+            'TotalPrice': self.data['TotalPrice'].to_numpy(dtype=np.float64)
+        })
+        reference_ns = int(reference_date.astype('datetime64[ns]').view('i8'))
+        
+        result = (
+            frame.lazy()
+            # Pandas yolundaki groupby(sort=False) gibi müşteriler ilk görülme sırasında döner
+            .group_by('CustomerID', maintain_order=True)
+            .agg(
+                pl.col('InvoiceDate').max().alias('last_purchase'),
+                pl.col('InvoiceNo').n_unique().alias('Frequency'),
+                pl.col('TotalPrice').sum().alias('Monetary')
+            )
+            .with_columns(((reference_ns - pl.col('last_purchase')) // NS_PER_DAY).alias('Recency'))
+            .collect()
+        )
+        
+        customers = result['CustomerID'].to_numpy()
+        if isinstance(customer_ids.dtype, pd.CategoricalDtype):
+            index = pd.CategoricalIndex(
+                pd.Categorical.from_codes(customers, dtype=customer_ids.dtype), name='CustomerID'
+            )
+        else:
+            index = pd.Index(cid_labels.to_numpy()[customers], name='CustomerID')
+        
+        return pd.DataFrame({
+            'Recency': result['Recency'].to_numpy().astype(np.int32),
+            'Frequency': result['Frequency'].to_numpy().astype(np.int32),
+            'Monetary': result['Monetary'].to_numpy().astype(np.float32)
+        }, index=index)
+    
     def segment_customers(self, r_bins=5, f_bins=5, m_bins=5):
         """
         Müşterileri RFM değerlerine göre segmentlere ayırır.
@@ -69,82 +184,105 @@ class RFMAnalyzer:
             self.calculate_rfm()
         
         # RFM skorları hesapla (r_score için düşük değerler iyi, f ve m için yüksek değerler iyi)
-        self.rfm['R_Score'] = pd.qcut(self.rfm['Recency'], q=r_bins, labels=range(r_bins, 0, -1))
-        self.rfm['F_Score'] = pd.qcut(self.rfm['Frequency'], q=f_bins, labels=range(1, f_bins+1))
-        self.rfm['M_Score'] = pd.qcut(self.rfm['Monetary'], q=m_bins, labels=range(1, m_bins+1))
-        
-        # RFM skorlarını birleştirerek RFM segmentini oluştur
-        self.rfm['RFM_Score'] = self.rfm['R_Score'].astype(str) + self.rfm['F_Score'].astype(str) + self.rfm['M_Score'].astype(str)
-        
-        # RFM Segment tanımlamaları
-        self.rfm['Segment'] = 'Low-Value'
-        self.rfm.loc[self.rfm['RFM_Score'].str[0].astype(int) >= 4, 'Segment'] = 'Champions'
-        self.rfm.loc[(self.rfm['RFM_Score'].str[0].astype(int) >= 2) & 
-                     (self.rfm['RFM_Score'].str[0].astype(int) < 4) & 
-                     (self.rfm['RFM_Score'].str[1].astype(int) >= 3), 'Segment'] = 'Loyal Customers'
-        self.rfm.loc[(self.rfm['RFM_Score'].str[0].astype(int) >= 3) & 
-                     (self.rfm['RFM_Score'].str[1].astype(int) < 3), 'Segment'] = 'Potential Loyalists'
-        self.rfm.loc[(self.rfm['RFM_Score'].str[0].astype(int) < 2) & 
-                     (self.rfm['RFM_Score'].str[1].astype(int) >= 4), 'Segment'] = 'At Risk'
-        self.rfm.loc[(self.rfm['RFM_Score'].str[0].astype(int) < 2) & 
-                     (self.rfm['RFM_Score'].str[1].astype(int) < 2), 'Segment'] = 'Lost'
+        # Skorlar ve segment kodları NumPy dizilerinde hesaplanır, tabloya her sütun bir kez yazılır
+        r = _score(self.rfm['Recency'], r_bins, reverse=True)
+        f = _score(self.rfm['Frequency'], f_bins)
+        m = _score(self.rfm['Monetary'], m_bins)
+        segment_codes = label_segments(r, f)
+        
+        self.rfm['R_Score'] = r
+        self.rfm['F_Score'] = f
+        self.rfm['M_Score'] = m
+        # RFM skorlarını birleştirerek RFM segmentini oluştur (ör. 5, 4, 3 -> 543)
+        self.rfm['RFM_Score'] = r.astype(np.int16) * 100 + f * 10 + m
+        # RFM Segment tanımlamaları (tek geçişte segment kodu, ardından kategorik isimler)
+        self.rfm['Segment'] = pd.Categorical.from_codes(segment_codes, categories=SEGMENT_LABELS)
         
         self.rfm_segments = self.rfm
         
         print("Müşteri segmentasyonu tamamlandı.")
         return self.rfm_segments
     
-    def visualize_segments(self):
-        """Segment dağılımını görselleştirir."""
+    def visualize_segments(self, output_dir='.'):
+        """
+        Segment dağılımını görselleştirir.
+        
+        Args:
+            output_dir (str): Segment radar grafiklerinin PNG olarak kaydedileceği klasör
+        """
         if self.rfm_segments is None:
             self.segment_customers()
         
-        plt.figure(figsize=(10, 6))
-        segment_counts = self.rfm_segments['Segment'].value_counts()
-        sns.barplot(x=segment_counts.index, y=segment_counts.values)
-        plt.title('Müşteri Segment Dağılımı', fontsize=14)
-        plt.xlabel('Segment')
-        plt.ylabel('Müşteri Sayısı')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.show()
-        
-        # Segmentlere göre ortalama RFM değerleri
-        segment_means = self.rfm_segments.groupby('Segment').agg({
-            'Recency': 'mean',
-            'Frequency': 'mean',
-            'Monetary': 'mean'
-        })
+        if self.plot:
+            segment_counts = self.rfm_segments['Segment'].value_counts()
+            # Değerler önceden toplanmış; seaborn'un istatistik katmanı yerine doğrudan çubuk çizilir
+            fig, ax = plt.subplots(figsize=(10, 6))
+            ax.bar(segment_counts.index.astype(str), segment_counts.to_numpy())
+            ax.set_title('Müşteri Segment Dağılımı', fontsize=14)
+            ax.set_xlabel('Segment')
+            ax.set_ylabel('Müşteri Sayısı')
+            ax.tick_params(axis='x', labelrotation=45)
+            fig.tight_layout()
+            plt.show()
+        
+        # Segmentlere göre ortalama RFM değerleri: segment koduna göre bir kez sıralanır, toplamlar reduceat ile alınır
+        segments = self.rfm_segments['Segment']
+        codes = segments.cat.codes.to_numpy()
+        order = np.argsort(codes, kind='stable')
+        sizes = np.bincount(codes, minlength=len(segments.cat.categories))
+        observed = np.flatnonzero(sizes)  # Boş segmentler atlanır (groupby observed=True gibi)
+        starts = (np.cumsum(sizes) - sizes)[observed]
+        
+        metric_cols = ['Recency', 'Frequency', 'Monetary']
+        values = self.rfm_segments[metric_cols].to_numpy(dtype=np.float64)[order]
+        means = np.add.reduceat(values, starts, axis=0) / sizes[observed, None]
+        segment_means = pd.DataFrame(
+            means,
+            index=pd.CategoricalIndex(pd.Categorical.from_codes(observed, dtype=segments.dtype), name='Segment'),
+            columns=metric_cols
+        )
         
         print("Segmentlere Göre Ortalama RFM Değerleri:")
         print(segment_means)
         
+        if not self.plot:
+            return
+        
         # Radar chart ile segment karakteristiklerini gösterme
-        segment_means_norm = segment_means.copy()
-        for col in segment_means_norm.columns:
-            if col == 'Recency':  # Recency için düşük değerler daha iyi
-                segment_means_norm[col] = 1 - (segment_means_norm[col] - segment_means_norm[col].min()) / (segment_means_norm[col].max() - segment_means_norm[col].min())
-            else:
-                segment_means_norm[col] = (segment_means_norm[col] - segment_means_norm[col].min()) / (segment_means_norm[col].max() - segment_means_norm[col].min())
+        # Min-max normalizasyonu tüm sütunlara tek seferde uygulanır; Recency için düşük değerler daha iyi
+        arr = segment_means.to_numpy(dtype=np.float64)
+        mn = arr.min(axis=0)
+        mx = arr.max(axis=0)
+        norm = (arr - mn) / (mx - mn + 1e-12)
+        recency_col = segment_means.columns.get_loc('Recency')
+        norm[:, recency_col] = 1.0 - norm[:, recency_col]
+        segment_means_norm = pd.DataFrame(norm, index=segment_means.index, columns=segment_means.columns)
         
         # Radar chart
         categories = list(segment_means_norm.columns)
         N = len(categories)
         
+        # Açılar ve normalize değerler döngü dışında bir kez hazırlanır (son nokta çemberi kapatır)
+        angles = np.linspace(0, 2 * pi, N + 1)
+        norm_values = segment_means_norm.to_numpy()
+        
         # Her segment için bir radar chart çizimi
-        for segment in segment_means_norm.index:
-            values = segment_means_norm.loc[segment].values.tolist()
-            values += values[:1]  # Çemberi kapatmak için
-            
-            angles = [n / float(N) * 2 * pi for n in range(N)]
-            angles += angles[:1]  # Çemberi kapatmak için
+        os.makedirs(output_dir, exist_ok=True)
+        for i, segment in enumerate(segment_means_norm.index):
+            values = np.concatenate([norm_values[i], norm_values[i, :1]])
             
             fig, ax = plt.subplots(figsize=(8, 8), subplot_kw=dict(polar=True))
             ax.plot(angles, values, linewidth=2, linestyle='solid')
             ax.fill(angles, values, alpha=0.25)
             
-            plt.xticks(angles[:-1], categories, size=12)
-            plt.yticks([0.2, 0.4, 0.6, 0.8], ["0.2", "0.4", "0.6", "0.8"], size=10, color="grey")
-            plt.title(f'Segment: {segment}', size=15)
-            plt.tight_layout()
-            plt.show()
\ No newline at end of file
+            ax.set_xticks(angles[:-1])
+            ax.set_xticklabels(categories, size=12)
+            ax.set_yticks([0.2, 0.4, 0.6, 0.8])
+            ax.set_yticklabels(["0.2", "0.4", "0.6", "0.8"], size=10, color="grey")
+            ax.set_title(f'Segment: {segment}', size=15)
+            fig.tight_layout()
+            
+            # Figür ekranda tutulmaz; kaydedilip kapatılır, böylece bellek segment sayısıyla büyümez
+            slug = str(segment).lower().replace(' ', '_').replace('-', '_')
+            fig.savefig(os.path.join(output_dir, f'segment_{slug}.png'), dpi=100)
+            plt.close(fig)
\ No newline at end of file